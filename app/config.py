@@ -7,3 +7,25 @@ MASTER_CLIENT_ID = os.getenv("MASTER_CLIENT_ID")
 MASTER_CLIENT_SECRET = os.getenv("MASTER_CLIENT_SECRET")
 MASTER_ADMIN_USERNAME = os.getenv("MASTER_ADMIN_USERNAME")
 MASTER_ADMIN_PASSWORD = os.getenv("MASTER_ADMIN_PASSWORD")
+
+# Admission control: per-client token buckets (requests per minute / burst) and
+# per-route-group concurrency caps. A value of 0 disables that limit.
+LOGIN_RATE_PER_MINUTE = float(os.getenv("LOGIN_RATE_PER_MINUTE", 10))
+LOGIN_BURST = int(os.getenv("LOGIN_BURST", 5))
+LOGIN_MAX_CONCURRENCY = int(os.getenv("LOGIN_MAX_CONCURRENCY", 4))
+JOIN_RATE_PER_MINUTE = float(os.getenv("JOIN_RATE_PER_MINUTE", 30))
+JOIN_BURST = int(os.getenv("JOIN_BURST", 10))
+JOIN_MAX_CONCURRENCY = int(os.getenv("JOIN_MAX_CONCURRENCY", 8))
+DEFAULT_RATE_PER_MINUTE = float(os.getenv("DEFAULT_RATE_PER_MINUTE", 600))
+DEFAULT_BURST = int(os.getenv("DEFAULT_BURST", 100))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("DEFAULT_MAX_CONCURRENCY", 32))
+RATE_LIMIT_TRUST_FORWARDED_FOR = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+# Idempotency-Key replay store: "memory" (per process) or "db" (shared across workers)
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "memory").lower()
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 10000))
+# A running request's claim on a key lapses after this long (covers workers that died mid-request)
+IDEMPOTENCY_CLAIM_SECONDS = int(os.getenv("IDEMPOTENCY_CLAIM_SECONDS", 60))
+# How long a duplicate waits for the claiming request before getting 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 10))
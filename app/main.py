@@ -1,14 +1,24 @@
 # event_management_api/main.py
 from fastapi import FastAPI
-from app.routes import users, events, event_participation
+from app.middleware import AdmissionControlMiddleware, IdempotencyMiddleware, admission_controller
+from app.routes import users, events, event_participation, analytics
 
 app = FastAPI(title="Event Management API")
+# Added last runs first: shed load before doing idempotency lookups
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(AdmissionControlMiddleware, controller=admission_controller)
 
 app.include_router(users.router, prefix="/users", tags=["Users"])
 app.include_router(events.router, prefix="/events", tags=["Events"])
 app.include_router(event_participation.router, prefix="/event-participation", tags=["Event Participation"])
+app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
 
 
 @app.get("/health")
 def health():
     return {"message": "Welcome to the Event Management API"}
+
+
+@app.get("/metrics/admission")
+def admission_metrics():
+    return admission_controller.snapshot()
@@ -1,6 +1,16 @@
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Dict, Optional
+from app import config
+from app.services.auth import access_token_subject
+from app.services.idempotency import IdempotencyStore, StoredResponse, build_store
+from app.services.rate_limit import AdmissionController, TokenBucketLimit
+import asyncio
+import hashlib
+import re
 import time
 
 def add_middlewares(app):
@@ -20,3 +30,208 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
         process_time = time.time() - start_time
         print(f"Request {request.method} {request.url} took {process_time:.4f} seconds")
         return response
+
+
+# ------------------------
+# 🔹 Admission Control (Rate Limiting & Load Shedding)
+# ------------------------
+def _limit(rate_per_minute: float, burst: int):
+    return TokenBucketLimit(rate=rate_per_minute / 60.0, burst=burst) if rate_per_minute > 0 and burst > 0 else None
+
+
+def _build_admission_controller() -> AdmissionController:
+    limits = {
+        "login": _limit(config.LOGIN_RATE_PER_MINUTE, config.LOGIN_BURST),
+        "join": _limit(config.JOIN_RATE_PER_MINUTE, config.JOIN_BURST),
+        "default": _limit(config.DEFAULT_RATE_PER_MINUTE, config.DEFAULT_BURST),
+    }
+    concurrency = {
+        "login": config.LOGIN_MAX_CONCURRENCY,
+        "join": config.JOIN_MAX_CONCURRENCY,
+        "default": config.DEFAULT_MAX_CONCURRENCY,
+    }
+    return AdmissionController(
+        limits={group: limit for group, limit in limits.items() if limit},
+        concurrency={group: cap for group, cap in concurrency.items() if cap > 0},
+    )
+
+
+admission_controller = _build_admission_controller()
+
+# Never shed these: they do not touch the DB and must answer while the API is saturated
+ADMISSION_EXEMPT_PATHS = {"/health", "/metrics/admission", "/docs", "/redoc", "/openapi.json"}
+JOIN_PATH = re.compile(r"^/event-participation/events/[^/]+/join$")
+
+
+def route_group(request: Request) -> Optional[str]:
+    path = request.url.path
+    if path in ADMISSION_EXEMPT_PATHS:
+        return None
+    if request.method == "POST" and path == "/users/login":
+        return "login"
+    if request.method == "POST" and JOIN_PATH.match(path):
+        return "join"
+    return "default"
+
+
+def client_id(request: Request) -> str:
+    if config.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class AdmissionControlMiddleware(BaseHTTPMiddleware):
+    """Sheds excess traffic before the route opens a DB session or hashes a password."""
+
+    def __init__(self, app, controller: AdmissionController = None):
+        super().__init__(app)
+        self.controller = controller or admission_controller
+
+    async def dispatch(self, request: Request, call_next):
+        group = route_group(request)
+        if group is None:
+            return await call_next(request)
+
+        decision = self.controller.admit(group, client_id(request))
+        if not decision.allowed:
+            detail = "Too many requests" if decision.status_code == 429 else "Service overloaded, retry later"
+            return JSONResponse(
+                status_code=decision.status_code,
+                content={"detail": detail},
+                headers={"Retry-After": str(decision.retry_after)},
+            )
+
+        try:
+            return await call_next(request)
+        finally:
+            self.controller.release(group)
+
+
+# ------------------------
+# 🔹 Idempotency Keys (Replay Stored Responses for Client Retries)
+# ------------------------
+IDEMPOTENT_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Token responses must never be cached and replayed
+IDEMPOTENCY_EXEMPT_PATHS = {"/users/login", "/users/refresh"}
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+IDEMPOTENCY_POLL_SECONDS = 0.2  # How often a duplicate re-checks a key claimed by another worker
+
+
+def _requester(request: Request) -> Optional[str]:
+    """
+    Scope keys per requester so one client can never replay another's response.
+    Signature-only: revocation checks may hit the DB and are left to the route.
+    """
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    return access_token_subject(authorization[7:])
+
+
+def idempotency_store_key(requester: str, idempotency_key: str) -> str:
+    return hashlib.sha256(f"{requester}\n{idempotency_key}".encode()).hexdigest()
+
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """
+    Honours the `Idempotency-Key` header on mutating routes: the first response
+    (unless it is a 5xx) is stored and replayed for retries without running the
+    route again. The request that claims a key in the store runs the route; duplicates
+    on this worker wait for it, duplicates on other workers poll the store and get 409
+    if it is still running after IDEMPOTENCY_WAIT_SECONDS.
+    """
+
+    def __init__(self, app, store: IdempotencyStore = None):
+        super().__init__(app)
+        self.store = store or build_store(
+            config.IDEMPOTENCY_BACKEND, config.IDEMPOTENCY_TTL_SECONDS, config.IDEMPOTENCY_MAX_ENTRIES,
+            config.IDEMPOTENCY_CLAIM_SECONDS,
+        )
+        self._in_flight: Dict[str, asyncio.Event] = {}
+
+    async def dispatch(self, request: Request, call_next):
+        idempotency_key = request.headers.get("idempotency-key")
+        if (
+            not idempotency_key
+            or request.method not in IDEMPOTENT_METHODS
+            or request.url.path in IDEMPOTENCY_EXEMPT_PATHS
+        ):
+            return await call_next(request)
+
+        if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return JSONResponse(status_code=400, content={"detail": "Idempotency-Key is too long"})
+
+        requester = _requester(request)
+        if requester is None:
+            # Unauthenticated: let the route reject it, never store anything
+            return await call_next(request)
+
+        body = await request.body()
+        fingerprint = hashlib.sha256(
+            b"\n".join([request.method.encode(), str(request.url.path).encode(), str(request.url.query).encode(), body])
+        ).hexdigest()
+        store_key = idempotency_store_key(requester, idempotency_key)
+
+        deadline = time.monotonic() + config.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            stored = await run_in_threadpool(self.store.get, store_key)
+            if stored is not None:
+                return self._replay(stored, fingerprint)
+
+            pending = self._in_flight.get(store_key)
+            if pending is not None:
+                # Same key already running on this worker: wait, then replay its result (or run if it failed)
+                await pending.wait()
+                continue
+
+            pending = self._in_flight[store_key] = asyncio.Event()
+            if await run_in_threadpool(self.store.claim, store_key, fingerprint):
+                break
+            del self._in_flight[store_key]
+            pending.set()
+
+            # Another worker holds the key: poll until it stores a response or releases the claim
+            if time.monotonic() >= deadline:
+                return JSONResponse(
+                    status_code=409,
+                    content={"detail": "A request with this Idempotency-Key is still in progress"},
+                    headers={"Retry-After": "1"},
+                )
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+        stored_response = False
+        try:
+            response = await call_next(request)
+            content = b"".join([chunk async for chunk in response.body_iterator])
+            if response.status_code < 500:
+                stored = StoredResponse(fingerprint, response.status_code, response.headers.get("content-type"), content)
+                await run_in_threadpool(self.store.put, store_key, stored)
+                stored_response = True
+            return Response(
+                content=content,
+                status_code=response.status_code,
+                headers=dict(response.headers),
+                background=response.background,
+            )
+        finally:
+            if not stored_response:
+                # 5xx or crash: drop the claim so the client's retry runs the route again
+                await run_in_threadpool(self.store.release, store_key)
+            del self._in_flight[store_key]
+            pending.set()
+
+    @staticmethod
+    def _replay(stored: StoredResponse, fingerprint: str) -> Response:
+        if stored.fingerprint != fingerprint:
+            return JSONResponse(
+                status_code=422,
+                content={"detail": "Idempotency-Key was already used with a different request"},
+            )
+        return Response(
+            content=stored.body,
+            status_code=stored.status_code,
+            media_type=stored.content_type,
+            headers={"Idempotent-Replayed": "true"},
+        )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Date, Boolean, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db import Base
@@ -15,6 +15,7 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
+    token_version = Column(Integer, nullable=False, default=0)  # Bumped to invalidate issued tokens
 
     # Relationships
     organized_events = relationship("Event", back_populates="organizer")
@@ -59,3 +60,72 @@ class EventAttendee(Base):
 
     # Ensure a user cannot register for the same event twice
     __table_args__ = (UniqueConstraint("event_id", "user_id", name="unique_event_user"),)
+
+
+# ------------------------------
+# 🔹 TokenRevocation Model (Tokens Issued Below min_version Are Rejected)
+# ------------------------------
+class TokenRevocation(Base):
+    __tablename__ = "token_revocations"
+    user_id = Column(Integer, primary_key=True)  # No FK: rows must outlive deleted users
+    min_version = Column(Integer, nullable=False)
+    revoked_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+
+# ------------------------------
+# 🔹 RefreshToken Model (Issued Refresh Tokens, Each Usable Once)
+# ------------------------------
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    jti = Column(String(64), primary_key=True)
+    user_id = Column(Integer, nullable=True)  # NULL for the Master Admin
+    expires_at = Column(DateTime, nullable=False, index=True)
+    used_at = Column(DateTime, nullable=True)
+
+# ------------------------------
+# 🔹 IdempotencyRecord Model (Stored Responses for Idempotency-Key Replays)
+# ------------------------------
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_records"
+    key = Column(String(64), primary_key=True)  # sha256 of requester + Idempotency-Key
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)  # NULL while the claiming request is still running
+    content_type = Column(String(255), nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+# ------------------------------
+# 🔹 EventStats Model (Rollup: Per-Event Occupancy)
+# ------------------------------
+class EventStats(Base):
+    __tablename__ = "event_stats"
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), primary_key=True)
+    attendee_count = Column(Integer, nullable=False, default=0)
+    total_joins = Column(Integer, nullable=False, default=0)
+    total_leaves = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# ------------------------------
+# 🔹 RegistrationDailyStats Model (Rollup: Per-Day Registration Buckets)
+# ------------------------------
+class RegistrationDailyStats(Base):
+    __tablename__ = "registration_daily_stats"
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    joins = Column(Integer, nullable=False, default=0)
+    leaves = Column(Integer, nullable=False, default=0)
+
+
+# ------------------------------
+# 🔹 OrganizerStats Model (Rollup: Per-Organizer Aggregates)
+# ------------------------------
+class OrganizerStats(Base):
+    __tablename__ = "organizer_stats"
+    organizer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    event_count = Column(Integer, nullable=False, default=0)
+    attendee_count = Column(Integer, nullable=False, default=0)
+    capacity = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,107 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import date
+from app.db import get_db
+from app.models import Event, EventStats, RegistrationDailyStats, OrganizerStats
+from app.schemas import EventOccupancyResponse, OrganizerStatsResponse, DailyRegistrationBucket
+from app.services.auth import decode_access_token
+from app.services.analytics import rebuild_rollups
+from app.routes.events import is_admin_or_master_admin
+from typing import Optional
+from fastapi.security import OAuth2PasswordBearer
+
+router = APIRouter()
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
+
+
+def _ensure_admin_or_owner(payload: dict, organizer_id: int):
+    """Admins see every dashboard; organizers only see their own."""
+    if payload["uid"] is None or payload["uid"] != organizer_id:
+        is_admin_or_master_admin(payload)
+
+
+def _fill_rate(count: int, capacity: Optional[int]) -> Optional[float]:
+    return round(count / capacity, 4) if capacity else None
+
+
+# ------------------------
+# 🔹 Event Occupancy (Organizer of the Event, Admins & Master Admin)
+# ------------------------
+@router.get("/events/{event_id}", response_model=EventOccupancyResponse)
+def event_occupancy(
+    event_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+):
+    """Fill rate and registrations over time for one event, served from rollup counters."""
+    payload = decode_access_token(token)
+
+    event = db.query(Event.id, Event.organizer_id, Event.max_attendees).filter(Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+
+    _ensure_admin_or_owner(payload, event.organizer_id)
+
+    stats = db.query(EventStats).filter(EventStats.event_id == event_id).first()
+    buckets = db.query(RegistrationDailyStats).filter(RegistrationDailyStats.event_id == event_id)
+    if start:
+        buckets = buckets.filter(RegistrationDailyStats.day >= start)
+    if end:
+        buckets = buckets.filter(RegistrationDailyStats.day <= end)
+
+    attendee_count = stats.attendee_count if stats else 0
+    return EventOccupancyResponse(
+        event_id=event_id,
+        attendee_count=attendee_count,
+        max_attendees=event.max_attendees,
+        fill_rate=_fill_rate(attendee_count, event.max_attendees),
+        total_joins=stats.total_joins if stats else 0,
+        total_leaves=stats.total_leaves if stats else 0,
+        daily_registrations=[
+            DailyRegistrationBucket(day=bucket.day, joins=bucket.joins, leaves=bucket.leaves)
+            for bucket in buckets.order_by(RegistrationDailyStats.day).all()
+        ],
+    )
+
+
+# ------------------------
+# 🔹 Organizer Totals (The Organizer, Admins & Master Admin)
+# ------------------------
+@router.get("/organizers/{organizer_id}", response_model=OrganizerStatsResponse)
+def organizer_stats(organizer_id: int, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    """Aggregated events, registrations and capacity for an organizer."""
+    payload = decode_access_token(token)
+    _ensure_admin_or_owner(payload, organizer_id)
+
+    stats = db.query(OrganizerStats).filter(OrganizerStats.organizer_id == organizer_id).first()
+    if not stats:
+        return OrganizerStatsResponse(organizer_id=organizer_id, event_count=0, attendee_count=0, capacity=0, fill_rate=None)
+
+    return OrganizerStatsResponse(
+        organizer_id=organizer_id,
+        event_count=stats.event_count,
+        attendee_count=stats.attendee_count,
+        capacity=stats.capacity,
+        fill_rate=_fill_rate(stats.attendee_count, stats.capacity),
+    )
+
+
+# ------------------------
+# 🔹 Rebuild Rollups from Base Tables (Admins & Master Admin Only)
+# ------------------------
+@router.post("/reconcile")
+def reconcile(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    """Correct the analytics counters that events and event_attendees can derive."""
+    payload = decode_access_token(token)
+    is_admin_or_master_admin(payload)
+
+    try:
+        summary = rebuild_rollups(db)
+        db.commit()
+        return {"message": "Analytics rollups reconciled", **summary}
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Reconciliation failed: {str(e)}")
@@ -2,8 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from app.db import get_db
-from app.models import Event, EventAttendee, User
+from app.models import Event, EventAttendee
 from app.services.auth import decode_access_token
+from app.services.analytics import record_join, record_leave
 from fastapi.security import OAuth2PasswordBearer
 
 router = APIRouter()
@@ -17,9 +18,9 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 def join_event(event_id: int, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     """Allows users to sign up for an event."""
     payload = decode_access_token(token)
-    user = db.query(User).filter(User.username == payload.get("sub")).first()
+    user_id = payload["uid"]
 
-    if not user:
+    if user_id is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user credentials")
 
     event = db.query(Event).filter(Event.id == event_id).first()
@@ -29,13 +30,14 @@ def join_event(event_id: int, db: Session = Depends(get_db), token: str = Depend
     if len(event.attendees) >= event.max_attendees:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Event is full")
 
-    existing_registration = db.query(EventAttendee).filter_by(event_id=event_id, user_id=user.id).first()
+    existing_registration = db.query(EventAttendee).filter_by(event_id=event_id, user_id=user_id).first()
     if existing_registration:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already registered for this event")
 
-    registration = EventAttendee(event_id=event_id, user_id=user.id)
+    registration = EventAttendee(event_id=event_id, user_id=user_id)
 
     try:
+        record_join(db, event)  # Before the add, so first-touch seeding does not count it twice
         db.add(registration)
         db.commit()
         return {"message": "Successfully registered for the event"}
@@ -51,16 +53,17 @@ def join_event(event_id: int, db: Session = Depends(get_db), token: str = Depend
 def leave_event(event_id: int, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     """Allows users to cancel their registration for an event."""
     payload = decode_access_token(token)
-    user = db.query(User).filter(User.username == payload.get("sub")).first()
+    user_id = payload["uid"]
 
-    if not user:
+    if user_id is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user credentials")
 
-    registration = db.query(EventAttendee).filter_by(event_id=event_id, user_id=user.id).first()
+    registration = db.query(EventAttendee).filter_by(event_id=event_id, user_id=user_id).first()
     if not registration:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You are not registered for this event")
 
     try:
+        record_leave(db, registration.event)
         db.delete(registration)
         db.commit()
         return {"message": "Successfully unregistered from the event"}
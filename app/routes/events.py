@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 from app.db import get_db
-from app.models import Event, EventAttendee, User
-from app.schemas import EventCreate, EventUpdate, EventResponse, EventAttendeeResponse
+from app.models import Event, EventAttendee
+from app.schemas import EventCreate, EventBulkCreate, EventUpdate, EventResponse, EventAttendeeResponse, MAX_BULK_EVENTS
 from app.services.auth import decode_access_token
-from typing import List
+from app.services.analytics import record_event_created, record_events_created, record_event_deleted
+from typing import List, Optional
 import os
 from fastapi.security import OAuth2PasswordBearer
 
@@ -17,14 +18,31 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 MASTER_ADMIN_USERNAME = os.getenv("MASTER_ADMIN_USERNAME", "masteradmin")
 
 
-def is_admin_or_master_admin(user: User):
-    """Checks if the user is an Admin or Master Admin."""
-    if not user or (user.role.lower() != "admin" and user.username != MASTER_ADMIN_USERNAME):
+def is_admin_or_master_admin(payload: dict):
+    """Checks from the token claims if the requester is an Admin or Master Admin."""
+    if payload.get("role", "").lower() != "admin" and payload.get("sub") != MASTER_ADMIN_USERNAME:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Access denied. Admins only."
         )
 
 
+def to_event_response(event: Event, attendees: Optional[List[EventAttendeeResponse]] = None) -> EventResponse:
+    """Pass `attendees` to skip loading the relationship (e.g. for events that were just inserted)."""
+    if attendees is None:
+        attendees = [EventAttendeeResponse(user_id=att.user_id) for att in event.attendees]
+    return EventResponse(
+        id=event.id,
+        title=event.title,
+        description=event.description,
+        location=event.location,
+        date=event.date,
+        status=event.status,
+        organizer_id=event.organizer_id,
+        max_attendees=event.max_attendees,
+        attendees=attendees
+    )
+
+
 # ------------------------
 # 🔹 Create an Event (Organizers Only)
 # ------------------------
@@ -32,15 +50,16 @@ def is_admin_or_master_admin(user: User):
 def create_event(event: EventCreate, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     """Allows event organizers to create events."""
     payload = decode_access_token(token)
-    user = db.query(User).filter(User.username == payload.get("sub")).first()
 
-    if not user or user.role.lower() != "organizer":
+    if payload["uid"] is None or payload["role"].lower() != "organizer":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only event organizers can create events.")
 
-    new_event = Event(**event.dict(), organizer_id=user.id)
+    new_event = Event(**event.dict(), organizer_id=payload["uid"])
 
     try:
         db.add(new_event)
+        db.flush()
+        record_event_created(db, new_event)
         db.commit()
         db.refresh(new_event)
         return new_event
@@ -49,6 +68,32 @@ def create_event(event: EventCreate, db: Session = Depends(get_db), token: str =
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database error: {str(e)}")
     
 
+# ------------------------
+# 🔹 Bulk Create Events (Organizers Only)
+# ------------------------
+@router.post("/events/bulk", response_model=List[EventResponse], status_code=status.HTTP_201_CREATED)
+def create_events_bulk(bulk: EventBulkCreate, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    """Creates a list of events, or a recurring series, in a single transaction."""
+    payload = decode_access_token(token)
+
+    if payload["uid"] is None or payload["role"].lower() != "organizer":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only event organizers can create events.")
+
+    new_events = [Event(**event.dict(), organizer_id=payload["uid"]) for event in bulk.expand()]
+
+    try:
+        db.add_all(new_events)
+        db.flush()
+        record_events_created(db, new_events)
+        # Build responses before commit expires the instances; new events have no attendees yet
+        responses = [to_event_response(event, attendees=[]) for event in new_events]
+        db.commit()
+        return responses
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database error: {str(e)}")
+
+
 # ------------------------
 # 🔹 Update Event (Admins, Master Admin & Organizers)
 # ------------------------
@@ -56,15 +101,14 @@ def create_event(event: EventCreate, db: Session = Depends(get_db), token: str =
 def update_event(event_id: int, event_update: EventUpdate, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     """Allows event organizers, Admins, and Master Admin to update events."""
     payload = decode_access_token(token)
-    user = db.query(User).filter(User.username == payload.get("sub")).first()
 
     event = db.query(Event).filter(Event.id == event_id).first()
     if not event:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
 
     # Only Admins, Master Admin, or the event's creator can update
-    if user.id != event.organizer_id:
-        is_admin_or_master_admin(user)
+    if payload["uid"] is None or payload["uid"] != event.organizer_id:
+        is_admin_or_master_admin(payload)
 
     for field, value in event_update.dict(exclude_unset=True).items():
         setattr(event, field, value)
@@ -85,17 +129,17 @@ def update_event(event_id: int, event_update: EventUpdate, db: Session = Depends
 def delete_event(event_id: int, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     """Allows event organizers, Admins, and Master Admin to delete events."""
     payload = decode_access_token(token)
-    user = db.query(User).filter(User.username == payload.get("sub")).first()
 
     event = db.query(Event).filter(Event.id == event_id).first()
     if not event:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
 
     # Only Admins, Master Admin, or the event's creator can delete
-    if user.id != event.organizer_id:
-        is_admin_or_master_admin(user)
+    if payload["uid"] is None or payload["uid"] != event.organizer_id:
+        is_admin_or_master_admin(payload)
 
     try:
+        record_event_deleted(db, event)
         db.delete(event)
         db.commit()
         return {"message": "Event deleted successfully"}
@@ -113,26 +157,30 @@ def list_events(db: Session = Depends(get_db)):
     """Fetch all events with proper structure."""
     try:
         events = db.query(Event).all()
+        return [to_event_response(event) for event in events]
 
-        event_responses = []
-        for event in events:
-            event_responses.append(EventResponse(
-                id=event.id,
-                title=event.title,
-                description=event.description,
-                location=event.location,
-                date=event.date,
-                status=event.status,
-                organizer_id=event.organizer_id,
-                max_attendees=event.max_attendees,
-                attendees=[EventAttendeeResponse(user_id=att.user_id) for att in event.attendees]
-            ))
-
-        return event_responses
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error fetching events: {str(e)}")
 
+# ------------------------
+# 🔹 Get Many Events by ID (Anyone)
+# ------------------------
+# Declared before /events/{event_id} so "batch" is not parsed as an event id
+@router.get("/events/batch", response_model=List[EventResponse])
+def get_events_batch(ids: List[int] = Query(..., description="Event IDs, e.g. ?ids=1&ids=2"), db: Session = Depends(get_db)):
+    """Fetch many events in one query, in the requested order. Unknown IDs are skipped."""
+    unique_ids = list(dict.fromkeys(ids))
+    if len(unique_ids) > MAX_BULK_EVENTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {MAX_BULK_EVENTS} IDs per request.")
+
+    try:
+        events = {event.id: event for event in db.query(Event).filter(Event.id.in_(unique_ids)).all()}
     except SQLAlchemyError as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error fetching events: {str(e)}")
 
+    return [to_event_response(events[event_id]) for event_id in unique_ids if event_id in events]
+
+
 # ------------------------
 # 🔹 Get Event by ID (Anyone)
 # ------------------------
@@ -143,14 +191,4 @@ def get_event(event_id: int, db: Session = Depends(get_db)):
     if not event:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
 
-    return EventResponse(
-        id=event.id,
-        title=event.title,
-        description=event.description,
-        location=event.location,
-        date=event.date,
-        status=event.status,
-        organizer_id=event.organizer_id,
-        max_attendees=event.max_attendees,
-        attendees=[EventAttendeeResponse(user_id=att.user_id) for att in event.attendees]
-    )
\ No newline at end of file
+    return to_event_response(event)
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from datetime import timedelta
 from app.db import get_db
 from app.models import User
-from app.schemas import UserCreate, UserResponse, UserUpdate  # Added missing import
-from app.services.auth import hash_password, verify_password, create_access_token, decode_access_token
+from app.schemas import UserCreate, UserResponse, UserUpdate, TokenRefresh  # Added missing import
+from app.services.auth import (
+    hash_password, verify_password, issue_tokens, decode_access_token, decode_refresh_token,
+    revoke_user_tokens, revocations, consume_refresh_token, initial_token_version,
+)
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from typing import List
 import os
@@ -54,6 +56,8 @@ def register(user: UserCreate, db: Session = Depends(get_db), token: str = Depen
 
     try:
         db.add(new_user)
+        db.flush()
+        new_user.token_version = initial_token_version(db, new_user.id)
         db.commit()
         db.refresh(new_user)
         return new_user
@@ -62,6 +66,17 @@ def register(user: UserCreate, db: Session = Depends(get_db), token: str = Depen
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database error: {str(e)}")
 
 
+def issue_and_store_tokens(db: Session, *args, **kwargs) -> dict:
+    """Issue a token pair and commit its single-use refresh-token record."""
+    tokens = issue_tokens(db, *args, **kwargs)
+    try:
+        db.commit()
+        return tokens
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Token issue failed: {str(e)}")
+
+
 # ------------------------
 # 🔹 User Login & Token Generation
 # ------------------------
@@ -71,8 +86,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     
     # Master Admin Login (Bypass DB Query)
     if form_data.username == MASTER_ADMIN_USERNAME and form_data.password == MASTER_ADMIN_PASSWORD:
-        access_token = create_access_token({"sub": MASTER_ADMIN_USERNAME, "role": "admin"}, timedelta(hours=3))
-        return {"access_token": access_token, "token_type": "bearer"}
+        return issue_and_store_tokens(db, MASTER_ADMIN_USERNAME, "admin")
 
     # Query user from DB
     user = db.query(User).filter(User.username == form_data.username).first()
@@ -81,8 +95,41 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     if not user or not verify_password(form_data.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
-    access_token = create_access_token({"sub": user.username, "role": user.role}, timedelta(hours=3))
-    return {"access_token": access_token, "token_type": "bearer"}
+    return issue_and_store_tokens(db, user.username, user.role, user.id, user.token_version or 0)
+
+
+# ------------------------
+# 🔹 Refresh Access Token
+# ------------------------
+@router.post("/refresh")
+def refresh(body: TokenRefresh, db: Session = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access/refresh token pair. Each refresh token works
+    once, and the new pair keeps the original login time, so the session still ends
+    MAX_SESSION_HOURS after the password was entered.
+    """
+    payload = decode_refresh_token(body.refresh_token)
+
+    if not consume_refresh_token(db, payload["jti"]):
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token already used or expired")
+
+    # Master Admin has no DB row; decode_refresh_token already checked its credential fingerprint
+    if payload["uid"] is None:
+        if payload["sub"] != MASTER_ADMIN_USERNAME:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+        return issue_and_store_tokens(db, MASTER_ADMIN_USERNAME, "admin", auth_time=payload["auth_time"])
+
+    # One DB hit per refresh picks up role changes and catches revocations not yet cached
+    user = db.query(User).filter(User.id == payload["uid"]).first()
+    if not user or (user.token_version or 0) != payload["ver"]:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked")
+
+    return issue_and_store_tokens(
+        db, user.username, user.role, user.id, user.token_version or 0, auth_time=payload["auth_time"]
+    )
 
 
 # ------------------------
@@ -148,9 +195,15 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
     if user_update.role:
         user.role = user_update.role
 
+    # Identity or privilege changed: invalidate tokens issued before this update
+    if user_update.username or user_update.password or user_update.role:
+        user.token_version = (user.token_version or 0) + 1
+        revoke_user_tokens(db, user.id, user.token_version)
+
     try:
         db.commit()
         db.refresh(user)
+        revocations.revoke(user.id, user.token_version)
         return user
     except Exception as e:
         db.rollback()
@@ -175,9 +228,14 @@ def delete_user(user_id: int, db: Session = Depends(get_db), token: str = Depend
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
+    min_version = (user.token_version or 0) + 1
+    deleted_user_id = user.id
+
     try:
+        revoke_user_tokens(db, deleted_user_id, min_version)
         db.delete(user)
         db.commit()
+        revocations.revoke(deleted_user_id, min_version)
         return {"message": "User deleted successfully"}
     except Exception as e:
         db.rollback()
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, root_validator, validator
 from typing import Optional, List
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 import re
 
 # ------------------------------
@@ -48,6 +48,10 @@ class UserUpdate(BaseModel):
     role: Optional[str] = None
 
 
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
+
 # ------------------------------
 # 🔹 Event Schemas
 # ------------------------------
@@ -75,6 +79,44 @@ class EventCreate(BaseModel):
         orm_mode = True
 
 
+# Upper bound for one bulk import (covers a year of weekly sessions)
+MAX_BULK_EVENTS = 100
+
+
+class RecurrenceRule(BaseModel):
+    frequency: str = Field(..., pattern="^(daily|weekly)$")
+    interval: int = Field(1, gt=0)  # Every `interval` days/weeks
+    count: int = Field(..., gt=0, le=MAX_BULK_EVENTS)  # Number of occurrences, including the first
+
+
+class EventBulkCreate(BaseModel):
+    """Either an explicit list of events, or a template repeated by a recurrence rule."""
+    events: Optional[List[EventCreate]] = Field(None, min_length=1, max_length=MAX_BULK_EVENTS)
+    template: Optional[EventCreate] = None
+    recurrence: Optional[RecurrenceRule] = None
+
+    @root_validator(skip_on_failure=True)
+    def validate_source(cls, values):
+        has_list = values.get("events") is not None
+        has_series = values.get("template") is not None or values.get("recurrence") is not None
+        if has_list == has_series:
+            raise ValueError("Provide either 'events' or 'template' with 'recurrence'.")
+        if has_series and (values.get("template") is None or values.get("recurrence") is None):
+            raise ValueError("'template' and 'recurrence' must be provided together.")
+        return values
+
+    def expand(self) -> List[EventCreate]:
+        """Return the events to create, generating the recurrence series if needed."""
+        if self.events is not None:
+            return list(self.events)
+
+        step = timedelta(days=self.recurrence.interval * (7 if self.recurrence.frequency == "weekly" else 1))
+        return [
+            self.template.copy(update={"date": self.template.date + step * i})
+            for i in range(self.recurrence.count)
+        ]
+
+
 class EventUpdate(BaseModel):
     title: Optional[str] = Field(None, min_length=3, max_length=100)
     description: Optional[str] = Field(None, max_length=500)
@@ -123,3 +165,33 @@ class EventResponse(BaseModel):
 class EventAttendee(BaseModel):
     event_id: int
     user_id: int
+
+
+# ------------------------------
+# 🔹 Analytics Schemas
+# ------------------------------
+class DailyRegistrationBucket(BaseModel):
+    day: date
+    joins: int
+    leaves: int
+
+    class Config:
+        from_attributes = True
+
+
+class EventOccupancyResponse(BaseModel):
+    event_id: int
+    attendee_count: int
+    max_attendees: Optional[int]
+    fill_rate: Optional[float]  # None when the event has no capacity limit
+    total_joins: int
+    total_leaves: int
+    daily_registrations: List[DailyRegistrationBucket] = []
+
+
+class OrganizerStatsResponse(BaseModel):
+    organizer_id: int
+    event_count: int
+    attendee_count: int
+    capacity: int
+    fill_rate: Optional[float]  # None when none of the organizer's events has a capacity limit
@@ -0,0 +1,231 @@
+# event_management_api/app/services/analytics.py
+from datetime import datetime
+from typing import List
+from sqlalchemy import func, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Event, EventAttendee, EventStats, RegistrationDailyStats, OrganizerStats
+
+# Rollup counters are maintained incrementally by the write paths (create/delete event,
+# join/leave event) inside the caller's transaction. Nothing here commits; the route
+# that owns the session commits or rolls back the counters together with the base rows.
+#
+# Events and organizers that predate the counters have no rollup row. The first write
+# that touches one seeds it from the base tables, so the increment lands on the real
+# count. The record_* helpers must therefore run before the registration being added
+# or removed reaches the session, so the seed does not count it as well.
+
+
+def _bump(db: Session, model, filters: dict, **deltas):
+    """
+    Add `deltas` to a rollup row, creating it when missing, as a single upsert.
+
+    An UPDATE-then-INSERT lets two concurrent first writers (e.g. the first joins
+    of the day) both insert and fail on the primary key; the upsert cannot.
+    """
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        stmt = mysql_insert(table).values(**filters, **deltas)
+        changes = {column: table.c[column] + stmt.inserted[column] for column in deltas}
+        if "updated_at" in table.c:
+            changes["updated_at"] = datetime.utcnow()
+        db.execute(stmt.on_duplicate_key_update(changes))
+    elif dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(table).values(**filters, **deltas)
+        changes = {column: table.c[column] + stmt.excluded[column] for column in deltas}
+        if "updated_at" in table.c:
+            changes["updated_at"] = datetime.utcnow()
+        db.execute(stmt.on_conflict_do_update(index_elements=list(filters), set_=changes))
+    else:
+        # No native upsert: insert inside a savepoint and fall back to UPDATE if another writer won
+        increment = {table.c[column]: table.c[column] + delta for column, delta in deltas.items()}
+        where = [table.c[column] == value for column, value in filters.items()]
+        if db.execute(update(table).where(*where).values(increment)).rowcount:
+            return
+        try:
+            with db.begin_nested():
+                db.execute(table.insert().values(**filters, **deltas))
+        except IntegrityError:
+            db.execute(update(table).where(*where).values(increment))
+
+
+def _insert_if_missing(db: Session, model, keys: dict, **values):
+    """Insert a seed row unless one already exists. A concurrent seeder simply loses."""
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        stmt = mysql_insert(table).values(**keys, **values)
+        key = next(iter(keys))
+        db.execute(stmt.on_duplicate_key_update({key: table.c[key]}))
+    elif dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        db.execute(insert(table).values(**keys, **values).on_conflict_do_nothing(index_elements=list(keys)))
+    else:
+        try:
+            with db.begin_nested():
+                db.execute(table.insert().values(**keys, **values))
+        except IntegrityError:
+            pass
+
+
+def _ensure_event_stats(db: Session, event_id: int):
+    """Seed `event_stats` for an event created before the counters existed."""
+    if db.query(EventStats.event_id).filter(EventStats.event_id == event_id).first():
+        return
+    count = db.query(func.count(EventAttendee.id)).filter(EventAttendee.event_id == event_id).scalar() or 0
+    _insert_if_missing(db, EventStats, {"event_id": event_id}, attendee_count=count, total_joins=count, total_leaves=0)
+
+
+def _ensure_organizer_stats(db: Session, organizer_id: int, exclude_event_ids: List[int] = ()):
+    """Seed `organizer_stats` from the organizer's events, minus events still being recorded."""
+    if db.query(OrganizerStats.organizer_id).filter(OrganizerStats.organizer_id == organizer_id).first():
+        return
+    events = db.query(Event.id, Event.max_attendees).filter(Event.organizer_id == organizer_id)
+    if exclude_event_ids:
+        events = events.filter(~Event.id.in_(exclude_event_ids))
+    events = events.all()
+    event_ids = [event_id for event_id, _ in events]
+    attendee_count = (
+        db.query(func.count(EventAttendee.id)).filter(EventAttendee.event_id.in_(event_ids)).scalar() or 0
+        if event_ids else 0
+    )
+    _insert_if_missing(
+        db, OrganizerStats, {"organizer_id": organizer_id},
+        event_count=len(events), attendee_count=attendee_count,
+        capacity=sum(max_attendees or 0 for _, max_attendees in events),
+    )
+
+
+def record_event_created(db: Session, event: Event):
+    """Register a new event in the per-event and per-organizer rollups."""
+    record_events_created(db, [event])
+
+
+def record_events_created(db: Session, events: List[Event]):
+    """Register a batch of flushed events with one organizer update per organizer."""
+    db.add_all([EventStats(event_id=event.id, attendee_count=0, total_joins=0, total_leaves=0) for event in events])
+
+    per_organizer = {}
+    for event in events:
+        totals = per_organizer.setdefault(event.organizer_id, {"event_count": 0, "capacity": 0})
+        totals["event_count"] += 1
+        totals["capacity"] += event.max_attendees or 0
+    new_event_ids = [event.id for event in events]
+    for organizer_id, totals in per_organizer.items():
+        _ensure_organizer_stats(db, organizer_id, exclude_event_ids=new_event_ids)
+        _bump(db, OrganizerStats, {"organizer_id": organizer_id}, attendee_count=0, **totals)
+
+
+def record_event_deleted(db: Session, event: Event):
+    """Remove an event's contribution from the rollups."""
+    # Lock event_stats before organizer_stats, the same order as joins and rebuild_rollups
+    stats = db.query(EventStats).filter(EventStats.event_id == event.id).with_for_update().first()
+    if stats:
+        attendee_count = stats.attendee_count
+    else:
+        attendee_count = db.query(func.count(EventAttendee.id)).filter(EventAttendee.event_id == event.id).scalar() or 0
+    _ensure_organizer_stats(db, event.organizer_id)
+    _bump(db, OrganizerStats, {"organizer_id": event.organizer_id}, event_count=-1,
+          attendee_count=-attendee_count, capacity=-(event.max_attendees or 0))
+    db.query(RegistrationDailyStats).filter(RegistrationDailyStats.event_id == event.id).delete(synchronize_session=False)
+    db.query(EventStats).filter(EventStats.event_id == event.id).delete(synchronize_session=False)
+
+
+def record_join(db: Session, event: Event, joined_at: datetime = None):
+    """Count one registration for the event, its organizer and the day it happened."""
+    day = (joined_at or datetime.utcnow()).date()
+    _ensure_event_stats(db, event.id)
+    _bump(db, EventStats, {"event_id": event.id}, attendee_count=1, total_joins=1, total_leaves=0)
+    _bump(db, RegistrationDailyStats, {"event_id": event.id, "day": day}, joins=1, leaves=0)
+    _ensure_organizer_stats(db, event.organizer_id)
+    _bump(db, OrganizerStats, {"organizer_id": event.organizer_id}, event_count=0, attendee_count=1, capacity=0)
+
+
+def record_leave(db: Session, event: Event, left_at: datetime = None):
+    """Count one cancelled registration for the event, its organizer and the day it happened."""
+    day = (left_at or datetime.utcnow()).date()
+    _ensure_event_stats(db, event.id)
+    _bump(db, EventStats, {"event_id": event.id}, attendee_count=-1, total_joins=0, total_leaves=1)
+    _bump(db, RegistrationDailyStats, {"event_id": event.id, "day": day}, joins=0, leaves=1)
+    _ensure_organizer_stats(db, event.organizer_id)
+    _bump(db, OrganizerStats, {"organizer_id": event.organizer_id}, event_count=0, attendee_count=-1, capacity=0)
+
+
+def rebuild_rollups(db: Session) -> dict:
+    """
+    Reconciliation job: correct the rollups that `events` and `event_attendees` can derive.
+
+    Overwrites `event_stats.attendee_count` and every `organizer_stats` column, and creates
+    missing rows. Join/leave history (`total_joins`, `total_leaves`, daily buckets) cannot
+    be rebuilt because cancelled registrations are not kept, so it is left as is. The only
+    exception is an event with no history at all, which gets buckets from its current
+    attendees' `joined_at`. The caller is responsible for committing.
+
+    The rollup rows are locked first. Every write path touches `event_stats` before the
+    other rollups, so joins, leaves and event creation/deletion wait until the rebuild
+    commits and then apply on top of it. On MySQL this relies on InnoDB's default
+    REPEATABLE READ, where the full-scan lock also covers gaps (events without a
+    counter row yet); under READ COMMITTED, run it while joins are quiesced.
+    """
+    event_stats = {row.event_id: row for row in db.query(EventStats).with_for_update().all()}
+    organizer_stats = {row.organizer_id: row for row in db.query(OrganizerStats).with_for_update().all()}
+
+    attendee_counts = dict(
+        db.query(EventAttendee.event_id, func.count(EventAttendee.id)).group_by(EventAttendee.event_id).all()
+    )
+
+    organizers = {}
+    created = 0
+    events = db.query(Event.id, Event.organizer_id, Event.max_attendees).all()
+    for event_id, organizer_id, max_attendees in events:
+        count = attendee_counts.get(event_id, 0)
+        stats = event_stats.get(event_id)
+        if stats:
+            stats.attendee_count = count
+        else:
+            db.add(EventStats(event_id=event_id, attendee_count=count, total_joins=count, total_leaves=0))
+            created += 1
+        if organizer_id is None:
+            continue
+        totals = organizers.setdefault(organizer_id, {"event_count": 0, "attendee_count": 0, "capacity": 0})
+        totals["event_count"] += 1
+        totals["attendee_count"] += count
+        totals["capacity"] += max_attendees or 0
+
+    # Organizers whose events were all deleted drop back to zero
+    for organizer_id in organizer_stats.keys() - organizers.keys():
+        organizers[organizer_id] = {"event_count": 0, "attendee_count": 0, "capacity": 0}
+    for organizer_id, totals in organizers.items():
+        stats = organizer_stats.get(organizer_id)
+        if stats:
+            for column, value in totals.items():
+                setattr(stats, column, value)
+        else:
+            db.add(OrganizerStats(organizer_id=organizer_id, **totals))
+            created += 1
+
+    # func.date() keeps the bucketing in the database instead of loading every registration
+    with_history = {event_id for (event_id,) in db.query(RegistrationDailyStats.event_id).distinct().all()}
+    daily = (
+        db.query(EventAttendee.event_id, func.date(EventAttendee.joined_at), func.count(EventAttendee.id))
+        .group_by(EventAttendee.event_id, func.date(EventAttendee.joined_at))
+        .all()
+    )
+    backfilled = 0
+    for event_id, day, joins in daily:
+        if event_id in with_history:
+            continue
+        if isinstance(day, str):
+            day = datetime.strptime(day, "%Y-%m-%d").date()
+        db.add(RegistrationDailyStats(event_id=event_id, day=day, joins=joins, leaves=0))
+        backfilled += 1
+
+    db.flush()
+    return {"events": len(events), "organizers": len(organizers), "created_rows": created, "backfilled_daily_buckets": backfilled}
@@ -2,14 +2,37 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+import hashlib
+import hmac
+import itertools
 import os
+import threading
+import time
+import uuid
+from typing import Dict, Optional
 from dotenv import load_dotenv
 from fastapi import HTTPException, status
+from sqlalchemy import func, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.db import SessionLocal
+from app.models import RefreshToken, TokenRevocation
 
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "5f2a7b8e9c1d4f0a6d3e")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
+REVOCATION_REFRESH_SECONDS = int(os.getenv("REVOCATION_REFRESH_SECONDS", 30))
+MAX_SESSION_HOURS = int(os.getenv("MAX_SESSION_HOURS", 24))  # Refreshing never extends a session past this
+
+# Master Admin Credentials (Load from .env); only used to fingerprint its tokens here
+MASTER_ADMIN_USERNAME = os.getenv("MASTER_ADMIN_USERNAME", "masteradmin")
+MASTER_ADMIN_PASSWORD = os.getenv("MASTER_ADMIN_PASSWORD", "masteradmin")
+MASTER_ADMIN_TOKEN_VERSION = os.getenv("MASTER_ADMIN_TOKEN_VERSION", "0")
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -19,20 +42,232 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+
+# ------------------------
+# 🔹 Revocation Set
+# ------------------------
+class TokenRevocationCache:
+    """
+    In-memory map of user id -> minimum accepted token version.
+
+    Revocations made by this process apply immediately; revocations made by other
+    workers are picked up by a periodic reload of `token_revocations`, so token
+    checks never need a per-request DB lookup.
+    """
+
+    def __init__(self, refresh_seconds: int = REVOCATION_REFRESH_SECONDS):
+        self._min_versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._refresh_seconds = refresh_seconds
+        self._loaded_at = 0.0
+        self._refreshing = False
+
+    def revoke(self, user_id: int, min_version: int):
+        with self._lock:
+            self._min_versions[user_id] = max(min_version, self._min_versions.get(user_id, 0))
+
+    def is_revoked(self, user_id: Optional[int], version: int) -> bool:
+        if user_id is None:
+            return False
+        self._maybe_refresh()
+        return version < self._min_versions.get(user_id, 0)
+
+    def refresh(self, db: Session):
+        # Rows older than the refresh-token lifetime can only match tokens that already expired
+        cutoff = datetime.utcnow() - timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        rows = db.query(TokenRevocation.user_id, TokenRevocation.min_version).filter(TokenRevocation.revoked_at >= cutoff).all()
+        with self._lock:
+            self._min_versions = {user_id: min_version for user_id, min_version in rows}
+            self._loaded_at = time.monotonic()
+
+    def _maybe_refresh(self):
+        with self._lock:
+            if self._refreshing or time.monotonic() - self._loaded_at < self._refresh_seconds:
+                return
+            self._refreshing = True
+        db = SessionLocal()
+        try:
+            self.refresh(db)
+        except Exception:
+            # Keep serving from the last snapshot; retry on the next interval
+            with self._lock:
+                self._loaded_at = time.monotonic()
+        finally:
+            db.close()
+            with self._lock:
+                self._refreshing = False
+
+
+revocations = TokenRevocationCache()
+
+
+def revoke_user_tokens(db: Session, user_id: int, min_version: int):
+    """
+    Persist a revocation for `user_id` as a single upsert, so concurrent updates of the same
+    user cannot both insert. The caller commits, then calls `revocations.revoke()`.
+    """
+    table = TokenRevocation.__table__
+    now = datetime.utcnow()
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        stmt = mysql_insert(table).values(user_id=user_id, min_version=min_version, revoked_at=now)
+        db.execute(stmt.on_duplicate_key_update(
+            min_version=func.greatest(table.c.min_version, stmt.inserted.min_version), revoked_at=now,
+        ))
+    elif dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(table).values(user_id=user_id, min_version=min_version, revoked_at=now)
+        # SQLite spells GREATEST as the two-argument max()
+        greatest = func.greatest if dialect == "postgresql" else func.max
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={"min_version": greatest(table.c.min_version, stmt.excluded.min_version), "revoked_at": now},
+        ))
+    else:
+        # No native upsert: insert inside a savepoint and fall back to UPDATE if another writer won
+        try:
+            with db.begin_nested():
+                db.execute(table.insert().values(user_id=user_id, min_version=min_version, revoked_at=now))
+        except IntegrityError:
+            db.execute(update(table).where(table.c.user_id == user_id, table.c.min_version < min_version)
+                       .values(min_version=min_version, revoked_at=now))
+
+
+def initial_token_version(db: Session, user_id: int) -> int:
+    """
+    Starting token version for a newly created user. Databases may hand out the id of a
+    deleted user again (SQLite reuses the highest rowid), and that id can still have a
+    revocation on record; starting below it would reject every token the new user gets.
+    """
+    record = db.query(TokenRevocation.min_version).filter(TokenRevocation.user_id == user_id).first()
+    return record.min_version if record else 0
+
+
+# ------------------------
+# 🔹 Token Issuing & Decoding
+# ------------------------
+def _master_admin_fingerprint() -> str:
+    """
+    Master Admin tokens have no DB row to version, so they carry an HMAC of the configured
+    credentials instead. Changing MASTER_ADMIN_PASSWORD or bumping MASTER_ADMIN_TOKEN_VERSION
+    invalidates every Master Admin token already issued.
+    """
+    material = f"{MASTER_ADMIN_USERNAME}:{MASTER_ADMIN_PASSWORD}:{MASTER_ADMIN_TOKEN_VERSION}"
+    return hmac.new(SECRET_KEY.encode(), material.encode(), hashlib.sha256).hexdigest()[:32]
+
+def _session_deadline(auth_time: int) -> datetime:
+    """No token outlives MAX_SESSION_HOURS after the password login that started the session."""
+    return datetime.utcfromtimestamp(auth_time) + timedelta(hours=MAX_SESSION_HOURS)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    if "auth_time" in to_encode:
+        expire = min(expire, _session_deadline(to_encode["auth_time"]))
+    to_encode.update({"exp": expire, "type": "access"})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def decode_access_token(token: str):
+def create_refresh_token(data: dict, expires_delta: timedelta = None):
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    if "auth_time" in to_encode:
+        expire = min(expire, _session_deadline(to_encode["auth_time"]))
+    to_encode.update({"exp": expire, "type": "refresh"})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+# Delete expired refresh-token records once per this many issued tokens
+REFRESH_TOKEN_PURGE_EVERY = 100
+_issued_refresh_tokens = itertools.count(1)
+
+def issue_tokens(db: Session, username: str, role: str, user_id: Optional[int] = None, token_version: int = 0,
+                 auth_time: Optional[int] = None) -> dict:
+    """
+    Build the login/refresh response and record the refresh token's `jti` so it can be
+    used exactly once. `auth_time` is carried over from the original login on refresh.
+    Master Admin tokens carry no user id. The caller commits.
+    """
+    claims = {
+        "sub": username,
+        "role": role,
+        "uid": user_id,
+        "ver": token_version,
+        "auth_time": auth_time if auth_time is not None else int(time.time()),
+    }
+    if user_id is None:
+        claims["mfp"] = _master_admin_fingerprint()
+
+    if next(_issued_refresh_tokens) % REFRESH_TOKEN_PURGE_EVERY == 0:
+        db.query(RefreshToken).filter(RefreshToken.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+
+    jti = uuid.uuid4().hex
+    refresh_token = create_refresh_token({**claims, "jti": jti})
+    db.add(RefreshToken(
+        jti=jti,
+        user_id=user_id,
+        expires_at=min(datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS), _session_deadline(claims["auth_time"])),
+    ))
+    return {
+        "access_token": create_access_token(claims),
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+def consume_refresh_token(db: Session, jti: str) -> bool:
+    """Mark a refresh token as used. A single UPDATE, so only one concurrent caller can win."""
+    now = datetime.utcnow()
+    used = db.query(RefreshToken).filter(
+        RefreshToken.jti == jti, RefreshToken.used_at.is_(None), RefreshToken.expires_at > now
+    ).update({RefreshToken.used_at: now}, synchronize_session=False)
+    return used == 1
+
+def _decode(token: str, token_type: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         role: str = payload.get("role")
-        if username is None or role is None:
+        if username is None or role is None or payload.get("type") != token_type or "uid" not in payload:
             raise JWTError()
-        return {"sub": username, "role": role}
+        if "auth_time" not in payload or (token_type == "refresh" and "jti" not in payload):
+            raise JWTError()
+        claims = {
+            "sub": username,
+            "role": role,
+            "uid": payload.get("uid"),
+            "ver": payload.get("ver", 0),
+            "auth_time": payload["auth_time"],
+            "jti": payload.get("jti"),
+        }
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
-    
\ No newline at end of file
+
+    if _session_deadline(claims["auth_time"]) <= datetime.utcnow():
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session expired, please log in again")
+    if claims["uid"] is None:
+        if not hmac.compare_digest(str(payload.get("mfp", "")), _master_admin_fingerprint()):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked")
+    elif revocations.is_revoked(claims["uid"], claims["ver"]):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked")
+    return claims
+
+def access_token_subject(token: str) -> Optional[str]:
+    """
+    Identify the requester from an access token, checking only signature and expiry. Never touches the DB,
+    so it is safe on the event loop (middleware); routes still run `decode_access_token`.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("type") != "access" or payload.get("sub") is None:
+        return None
+    return f"uid:{payload['uid']}" if payload.get("uid") is not None else f"sub:{payload['sub']}"
+
+def decode_access_token(token: str):
+    """Validate an access token and return its claims (`sub`, `role`, `uid`, `ver`) without a DB lookup."""
+    return _decode(token, "access")
+
+def decode_refresh_token(token: str):
+    """Validate a refresh token's signature, session age and revocation. Single use is enforced by `consume_refresh_token`."""
+    return _decode(token, "refresh")
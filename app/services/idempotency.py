@@ -0,0 +1,186 @@
+# event_management_api/app/services/idempotency.py
+import threading
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy.exc import IntegrityError
+from app.db import SessionLocal
+from app.models import IdempotencyRecord
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    fingerprint: str  # Hash of method, path and body; a reused key with a different request is rejected
+    status_code: int
+    content_type: Optional[str]
+    body: bytes
+
+
+class IdempotencyStore(ABC):
+    """
+    Replay store keyed by a hash of the requester and its Idempotency-Key.
+
+    A request first `claim()`s its key; exactly one claimer wins and runs the route,
+    then either `put()`s the response or `release()`s the claim so a retry can run.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[StoredResponse]:
+        """Return the stored response for `key`, or None if missing, expired or still running."""
+
+    @abstractmethod
+    def claim(self, key: str, fingerprint: str) -> bool:
+        """Mark `key` as in progress. False if it is already claimed or answered."""
+
+    @abstractmethod
+    def put(self, key: str, response: StoredResponse):
+        """Store `response` under a claimed `key` until it expires."""
+
+    @abstractmethod
+    def release(self, key: str):
+        """Drop an unanswered claim (the request failed), letting the next retry run."""
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    """Bounded LRU with per-entry TTL. Entries are local to the process."""
+
+    def __init__(self, ttl_seconds: int, max_entries: int, claim_seconds: int):
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._claims: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._claim_seconds = claim_seconds
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def claim(self, key: str, fingerprint: str) -> bool:
+        if self.get(key) is not None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if self._claims.get(key, 0) > now:
+                return False
+            self._claims[key] = now + self._claim_seconds
+            return True
+
+    def put(self, key: str, response: StoredResponse):
+        with self._lock:
+            self._claims.pop(key, None)
+            self._entries[key] = (time.monotonic() + self._ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def release(self, key: str):
+        with self._lock:
+            self._claims.pop(key, None)
+
+
+class DatabaseIdempotencyStore(IdempotencyStore):
+    """
+    Stores responses in `idempotency_records` so every worker can replay them. A claim is
+    a row with no response yet; the primary-key insert decides which worker wins.
+    """
+
+    PURGE_EVERY = 100  # Delete expired rows once per this many writes
+
+    def __init__(self, ttl_seconds: int, claim_seconds: int):
+        self._ttl = ttl_seconds
+        self._claim_seconds = claim_seconds
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        db = SessionLocal()
+        try:
+            record = db.query(IdempotencyRecord).filter(
+                IdempotencyRecord.key == key,
+                IdempotencyRecord.status_code.isnot(None),
+                IdempotencyRecord.expires_at > datetime.utcnow(),
+            ).first()
+            if not record:
+                return None
+            return StoredResponse(record.fingerprint, record.status_code, record.content_type, record.body)
+        finally:
+            db.close()
+
+    def claim(self, key: str, fingerprint: str) -> bool:
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            # An expired response or a lapsed claim (dead worker) no longer holds the key
+            db.query(IdempotencyRecord).filter(
+                IdempotencyRecord.key == key, IdempotencyRecord.expires_at <= now
+            ).delete(synchronize_session=False)
+            db.add(IdempotencyRecord(
+                key=key,
+                fingerprint=fingerprint,
+                created_at=now,
+                expires_at=now + timedelta(seconds=self._claim_seconds),
+            ))
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+    def release(self, key: str):
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyRecord).filter(
+                IdempotencyRecord.key == key, IdempotencyRecord.status_code.is_(None)
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            # The claim still lapses after IDEMPOTENCY_CLAIM_SECONDS
+            db.rollback()
+        finally:
+            db.close()
+
+    def put(self, key: str, response: StoredResponse):
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % self.PURGE_EVERY == 0
+
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            if purge:
+                db.query(IdempotencyRecord).filter(IdempotencyRecord.expires_at <= now).delete(synchronize_session=False)
+            db.merge(IdempotencyRecord(
+                key=key,
+                fingerprint=response.fingerprint,
+                status_code=response.status_code,
+                content_type=response.content_type,
+                body=response.body,
+                created_at=now,
+                expires_at=now + timedelta(seconds=self._ttl),
+            ))
+            db.commit()
+        except Exception:
+            # Failing to store only costs a future replay; the response is already computed
+            db.rollback()
+        finally:
+            db.close()
+
+
+def build_store(backend: str, ttl_seconds: int, max_entries: int, claim_seconds: int) -> IdempotencyStore:
+    if backend == "db":
+        return DatabaseIdempotencyStore(ttl_seconds, claim_seconds)
+    return InMemoryIdempotencyStore(ttl_seconds, max_entries, claim_seconds)
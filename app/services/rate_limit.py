@@ -0,0 +1,157 @@
+# event_management_api/app/services/rate_limit.py
+import math
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class TokenBucketLimit:
+    """`rate` tokens are refilled per second up to `burst` tokens."""
+    rate: float
+    burst: int
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage for token buckets. The default backend keeps state per process; a shared
+    backend (e.g. Redis) can be plugged in with `set_backend()` so limits hold across
+    workers. `take()` must be atomic per key.
+
+    `now` is wall-clock time (`time.time()`), so processes sharing a backend agree on it.
+    A shared backend may prefer its own server clock to avoid host clock skew.
+    """
+
+    @abstractmethod
+    def take(self, key: str, limit: TokenBucketLimit, now: float) -> Tuple[bool, float]:
+        """Consume one token. Returns (allowed, seconds until a token is available)."""
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Per-process buckets. Ignores the caller's wall-clock `now` and refills on the
+    monotonic clock, which cannot jump backwards; only this process ever reads it.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def take(self, key: str, limit: TokenBucketLimit, now: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(limit.burst), now))
+            tokens = min(float(limit.burst), tokens + (now - updated) * limit.rate)
+            if tokens >= 1:
+                self._store(key, tokens - 1, now)
+                return True, 0.0
+            self._store(key, tokens, now)
+            return False, (1 - tokens) / limit.rate
+
+    def _store(self, key: str, tokens: float, now: float):
+        if key not in self._buckets and len(self._buckets) >= self._max_keys:
+            # Drop the oldest half; an evicted client simply starts again with a full bucket
+            for stale in sorted(self._buckets, key=lambda k: self._buckets[k][1])[: self._max_keys // 2]:
+                del self._buckets[stale]
+        self._buckets[key] = (tokens, now)
+
+
+class ConcurrencyLimiter:
+    """Caps in-flight requests per route group. Non-blocking: callers shed when full."""
+
+    def __init__(self):
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def acquire(self, group: str, limit: int) -> bool:
+        with self._lock:
+            if self._in_flight[group] >= limit:
+                return False
+            self._in_flight[group] += 1
+            return True
+
+    def release(self, group: str):
+        with self._lock:
+            self._in_flight[group] = max(0, self._in_flight[group] - 1)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._in_flight)
+
+
+class AdmissionMetrics:
+    """Counters for admitted and shed requests, keyed by route group and reason."""
+
+    def __init__(self):
+        self._admitted: Dict[str, int] = defaultdict(int)
+        self._shed: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def admitted(self, group: str):
+        with self._lock:
+            self._admitted[group] += 1
+
+    def shed(self, group: str, reason: str):
+        with self._lock:
+            self._shed[(group, reason)] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            shed: Dict[str, Dict[str, int]] = defaultdict(dict)
+            for (group, reason), count in self._shed.items():
+                shed[group][reason] = count
+            return {"admitted": dict(self._admitted), "shed": dict(shed)}
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    status_code: int = 200
+    retry_after: int = 0
+    reason: Optional[str] = None
+
+
+class AdmissionController:
+    """
+    Per-client token buckets plus per-group concurrency caps.
+
+    `admit()` must be paired with `release()` when it returns allowed=True.
+    """
+
+    def __init__(self, limits: Dict[str, TokenBucketLimit], concurrency: Dict[str, int],
+                 backend: Optional[RateLimitBackend] = None):
+        self.limits = limits
+        self.concurrency = concurrency
+        self.backend = backend or InMemoryRateLimitBackend()
+        self.concurrency_limiter = ConcurrencyLimiter()
+        self.metrics = AdmissionMetrics()
+
+    def set_backend(self, backend: RateLimitBackend):
+        self.backend = backend
+
+    def admit(self, group: str, client_id: str) -> Decision:
+        limit = self.limits.get(group)
+        if limit is not None:
+            allowed, wait = self.backend.take(f"{group}:{client_id}", limit, time.time())
+            if not allowed:
+                self.metrics.shed(group, "rate_limited")
+                return Decision(False, 429, max(1, math.ceil(wait)), "rate_limited")
+
+        cap = self.concurrency.get(group)
+        if cap is not None and not self.concurrency_limiter.acquire(group, cap):
+            self.metrics.shed(group, "overloaded")
+            return Decision(False, 503, 1, "overloaded")
+
+        self.metrics.admitted(group)
+        return Decision(True)
+
+    def release(self, group: str):
+        if group in self.concurrency:
+            self.concurrency_limiter.release(group)
+
+    def snapshot(self) -> dict:
+        return {**self.metrics.snapshot(), "in_flight": self.concurrency_limiter.snapshot()}
@@ -1,9 +1,65 @@
+import os
+import uuid
 import pytest
+
+# Run against a local SQLite file instead of the docker-compose MySQL, and keep the
+# login rate limit out of the way of the helpers below (set before the app loads .env)
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+os.environ.setdefault("LOGIN_BURST", "1000")
+os.environ.setdefault("LOGIN_RATE_PER_MINUTE", "1000")
+
 from fastapi.testclient import TestClient
 from app.main import app
+from app.db import Base, SessionLocal, engine
+from app.models import User
+from app.services.auth import hash_password
+
+Base.metadata.create_all(bind=engine)
 
 client = TestClient(app)
 
+SEED_PASSWORD = "Secret#123"
+
+
+# Helper: create a user directly in the DB and return (id, username)
+def seed_user(role):
+    username = f"{role}_{uuid.uuid4().hex[:8]}"
+    db = SessionLocal()
+    try:
+        user = User(username=username, password=hash_password(SEED_PASSWORD), role=role)
+        db.add(user)
+        db.commit()
+        return user.id, username
+    finally:
+        db.close()
+
+
+# Helper: log a seeded user in and return the token response
+def login_as(username, password=SEED_PASSWORD):
+    response = client.post("/users/login", data={"username": username, "password": password})
+    assert response.status_code == 200
+    return response.json()
+
+
+# Helper: seed a user with the given role and return (id, auth headers)
+def auth_as(role):
+    user_id, username = seed_user(role)
+    return user_id, {"Authorization": f"Bearer {login_as(username)['access_token']}"}
+
+
+# Helper: create an event as the given organizer and return its ID
+def create_test_event(headers, **overrides):
+    event_data = {
+        "title": "Test Meetup",
+        "location": "Online",
+        "date": "2030-05-20T10:00:00Z",
+        "max_attendees": 10,
+        **overrides
+    }
+    response = client.post("/events/events", json=event_data, headers=headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
 # Sample test user credentials
 test_user = {
     "username": "testuser",
@@ -67,5 +123,400 @@ def test_unauthorized_access():
     response = client.get("/users")
     assert response.status_code == 401  # Should return unauthorized error
 
+# Test Event Analytics (Requires Authentication)
+def test_event_analytics_requires_auth():
+    response = client.get("/analytics/events/1")
+    assert response.status_code == 401
+
+# Test Join/Leave Update the Occupancy Rollups
+def test_join_leave_update_analytics():
+    _, organizer = auth_as("organizer")
+    _, attendee = auth_as("attendee")
+    event_id = create_test_event(organizer)
+
+    assert client.post(f"/event-participation/events/{event_id}/join", headers=attendee).status_code == 200
+    stats = client.get(f"/analytics/events/{event_id}", headers=organizer).json()
+    assert stats["attendee_count"] == 1
+    assert stats["total_joins"] == 1
+    assert stats["fill_rate"] == 0.1
+    assert [(b["joins"], b["leaves"]) for b in stats["daily_registrations"]] == [(1, 0)]
+
+    assert client.delete(f"/event-participation/events/{event_id}/leave", headers=attendee).status_code == 200
+    stats = client.get(f"/analytics/events/{event_id}", headers=organizer).json()
+    assert stats["attendee_count"] == 0
+    assert stats["total_leaves"] == 1
+    assert [(b["joins"], b["leaves"]) for b in stats["daily_registrations"]] == [(1, 1)]
+
+# Test Analytics Are Restricted to the Organizer and Admins
+def test_event_analytics_other_organizer_forbidden():
+    _, organizer = auth_as("organizer")
+    _, other = auth_as("organizer")
+    event_id = create_test_event(organizer)
+    assert client.get(f"/analytics/events/{event_id}", headers=other).status_code == 403
+
+# Test Reconciliation Corrects Derivable Counters and Keeps History
+def test_reconcile_analytics():
+    from app.models import EventStats, OrganizerStats
+
+    organizer_id, organizer = auth_as("organizer")
+    _, attendee = auth_as("attendee")
+    _, leaver = auth_as("attendee")
+    _, admin = auth_as("admin")
+    event_id = create_test_event(organizer)
+    assert client.post(f"/event-participation/events/{event_id}/join", headers=attendee).status_code == 200
+    assert client.post(f"/event-participation/events/{event_id}/join", headers=leaver).status_code == 200
+    assert client.delete(f"/event-participation/events/{event_id}/leave", headers=leaver).status_code == 200
+
+    # Corrupt the counters behind the API's back
+    db = SessionLocal()
+    try:
+        db.query(EventStats).filter(EventStats.event_id == event_id).update({EventStats.attendee_count: 42})
+        db.query(OrganizerStats).filter(OrganizerStats.organizer_id == organizer_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    assert client.post("/analytics/reconcile", headers=organizer).status_code == 403
+    assert client.post("/analytics/reconcile", headers=admin).status_code == 200
+
+    stats = client.get(f"/analytics/events/{event_id}", headers=organizer).json()
+    assert stats["attendee_count"] == 1
+    # History that the base tables cannot reproduce survives the reconcile
+    assert stats["total_joins"] == 2
+    assert stats["total_leaves"] == 1
+    assert [(b["joins"], b["leaves"]) for b in stats["daily_registrations"]] == [(2, 1)]
+    totals = client.get(f"/analytics/organizers/{organizer_id}", headers=organizer).json()
+    assert totals["event_count"] == 1
+    assert totals["attendee_count"] == 1
+    assert totals["capacity"] == 10
+
+# Test Events Created Before the Counters Are Seeded on First Touch
+def test_analytics_seed_preexisting_event():
+    from datetime import datetime
+    from app.models import Event, EventAttendee
+
+    organizer_id, organizer = auth_as("organizer")
+    attendee_id, attendee = auth_as("attendee")
+    other_id, _ = seed_user("attendee")
+
+    # An event and registrations written without going through the rollups
+    db = SessionLocal()
+    try:
+        event = Event(title="Legacy Event", location="Online", date=datetime(2030, 5, 20), organizer_id=organizer_id, max_attendees=5)
+        db.add(event)
+        db.flush()
+        db.add_all([EventAttendee(event_id=event.id, user_id=attendee_id), EventAttendee(event_id=event.id, user_id=other_id)])
+        db.commit()
+        event_id = event.id
+    finally:
+        db.close()
+
+    assert client.delete(f"/event-participation/events/{event_id}/leave", headers=attendee).status_code == 200
+    stats = client.get(f"/analytics/events/{event_id}", headers=organizer).json()
+    assert stats["attendee_count"] == 1
+    totals = client.get(f"/analytics/organizers/{organizer_id}", headers=organizer).json()
+    assert totals["event_count"] == 1
+    assert totals["attendee_count"] == 1
+    assert totals["capacity"] == 5
+
+# Test Admission Metrics (Exempt from Rate Limiting)
+def test_admission_metrics():
+    response = client.get("/metrics/admission")
+    assert response.status_code == 200
+    assert "shed" in response.json()
+
+# Helper: a bare app behind an AdmissionController with small limits
+def admission_test_client(controller):
+    from fastapi import FastAPI
+    from app.middleware import AdmissionControlMiddleware
+
+    limited_app = FastAPI()
+    limited_app.add_middleware(AdmissionControlMiddleware, controller=controller)
+    limited_app.add_api_route("/users/login", lambda: {"ok": True}, methods=["POST"])
+    limited_app.add_api_route("/health", lambda: {"ok": True}, methods=["GET"])
+    return TestClient(limited_app)
+
+# Test Requests Past the Burst Get 429 with Retry-After
+def test_rate_limit_sheds_with_retry_after():
+    from app.services.rate_limit import AdmissionController, TokenBucketLimit
+
+    controller = AdmissionController(limits={"login": TokenBucketLimit(rate=10 / 60, burst=2)}, concurrency={})
+    limited = admission_test_client(controller)
+
+    assert limited.post("/users/login").status_code == 200
+    assert limited.post("/users/login").status_code == 200
+    response = limited.post("/users/login")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "6"
+    assert controller.snapshot()["shed"] == {"login": {"rate_limited": 1}}
+
+# Test a Full Concurrency Cap Gets 503 with Retry-After
+def test_concurrency_cap_sheds_with_503():
+    from app.services.rate_limit import AdmissionController
+
+    controller = AdmissionController(limits={}, concurrency={"login": 1})
+    limited = admission_test_client(controller)
+
+    assert controller.admit("login", "other-client").allowed  # Occupy the only slot
+    response = limited.post("/users/login")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+    controller.release("login")
+    assert limited.post("/users/login").status_code == 200
+
+# Test Exempt Paths Are Never Shed
+def test_exempt_paths_never_shed():
+    from app.services.rate_limit import AdmissionController, TokenBucketLimit
+
+    controller = AdmissionController(
+        limits={"default": TokenBucketLimit(rate=1 / 60, burst=1)}, concurrency={"default": 1}
+    )
+    limited = admission_test_client(controller)
+
+    assert controller.admit("default", "other-client").allowed  # Cap is full for non-exempt routes
+    for _ in range(5):
+        assert limited.get("/health").status_code == 200
+    assert controller.snapshot()["shed"] == {}
+
+# Test Shared Backends Receive Wall-Clock Time
+def test_rate_limit_backend_gets_wall_clock():
+    import time
+    from app.services.rate_limit import AdmissionController, RateLimitBackend, TokenBucketLimit
+
+    seen = []
+
+    class RecordingBackend(RateLimitBackend):
+        def take(self, key, limit, now):
+            seen.append(now)
+            return True, 0.0
+
+    controller = AdmissionController(limits={"login": TokenBucketLimit(rate=1, burst=1)}, concurrency={},
+                                     backend=RecordingBackend())
+    before = time.time()
+    assert controller.admit("login", "client").allowed
+    assert before <= seen[0] <= time.time()
+
+# Test a Backend Missing take() Fails at Construction
+def test_partial_rate_limit_backend_rejected():
+    from app.services.rate_limit import RateLimitBackend
+
+    class PartialBackend(RateLimitBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        PartialBackend()
+
+# Test Refresh with an Invalid Token
+def test_refresh_invalid_token():
+    response = client.post("/users/refresh", json={"refresh_token": "not-a-token"})
+    assert response.status_code == 401
+
+# Test Refresh Tokens Are Single Use
+def test_refresh_token_single_use():
+    _, username = seed_user("attendee")
+    original = login_as(username)["refresh_token"]
+
+    first = client.post("/users/refresh", json={"refresh_token": original})
+    assert first.status_code == 200
+    assert client.post("/users/refresh", json={"refresh_token": original}).status_code == 401  # Replay
+    assert client.post("/users/refresh", json={"refresh_token": first.json()["refresh_token"]}).status_code == 200
+
+# Test Changing a User's Role, Password or Username Revokes Issued Tokens
+@pytest.mark.parametrize("change", [{"role": "attendee"}, {"password": "Changed#456"}, {"username": None}])
+def test_update_user_revokes_tokens(change):
+    _, admin = auth_as("admin")
+    organizer_id, organizer = auth_as("organizer")
+    if "username" in change:
+        change = {"username": f"renamed_{uuid.uuid4().hex[:8]}"}
+    assert create_test_event(organizer)
+
+    assert client.put(f"/users/users/{organizer_id}", json=change, headers=admin).status_code == 200
+    response = client.post("/events/events", json={"title": "After Update", "location": "Online",
+                                                   "date": "2030-05-20T10:00:00Z"}, headers=organizer)
+    assert response.status_code == 401
+
+# Test Deleting a User Revokes Issued Tokens
+def test_delete_user_revokes_tokens():
+    _, admin = auth_as("admin")
+    attendee_id, attendee = auth_as("attendee")
+    _, organizer = auth_as("organizer")
+    event_id = create_test_event(organizer)
+
+    assert client.delete(f"/users/users/{attendee_id}", headers=admin).status_code == 200
+    response = client.post(f"/event-participation/events/{event_id}/join", headers=attendee)
+    assert response.status_code == 401
+
+# Test Admin Checks Are Served from the Token Claims Alone
+def test_admin_check_from_claims_only():
+    admin_id, admin = auth_as("admin")
+    _, organizer = auth_as("organizer")
+    event_id = create_test_event(organizer)
+
+    # Remove the admin's row without recording a revocation: only the claims are left
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.id == admin_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.put(f"/events/events/{event_id}", json={"title": "Admin Edit"}, headers=admin)
+    assert response.status_code == 200
+    assert response.json()["title"] == "Admin Edit"
+
+# Test a Reused User ID Does Not Inherit the Deleted User's Revocation
+def test_reused_user_id_not_revoked():
+    _, admin = auth_as("admin")
+    old_id, _ = seed_user("organizer")  # Highest id, so SQLite hands it out again
+    assert client.delete(f"/users/users/{old_id}", headers=admin).status_code == 200
+
+    username = f"reused_{uuid.uuid4().hex[:8]}"
+    response = client.post("/users/register", json={"username": username, "password": SEED_PASSWORD, "role": "organizer"},
+                           headers=admin)
+    assert response.status_code == 201
+    assert response.json()["id"] == old_id
+
+    headers = {"Authorization": f"Bearer {login_as(username)['access_token']}"}
+    assert create_test_event(headers)
+
+# Test Refreshing Cannot Extend a Session Past MAX_SESSION_HOURS
+def test_refresh_capped_by_session_lifetime(monkeypatch):
+    from app.services import auth
+
+    _, username = seed_user("attendee")
+    refresh_token = login_as(username)["refresh_token"]
+
+    monkeypatch.setattr(auth, "MAX_SESSION_HOURS", 0)
+    response = client.post("/users/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 401
+
+# Test Master Admin Tokens Stop Working When Its Password Changes
+def test_master_admin_tokens_revocable(monkeypatch):
+    from app.routes import users
+    from app.services import auth
+
+    for module in (users, auth):
+        monkeypatch.setattr(module, "MASTER_ADMIN_USERNAME", "rootadmin")
+        monkeypatch.setattr(module, "MASTER_ADMIN_PASSWORD", "Old#Pass123")
+    tokens = login_as("rootadmin", "Old#Pass123")
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert client.get("/users/users", headers=headers).status_code == 200
+
+    monkeypatch.setattr(auth, "MASTER_ADMIN_PASSWORD", "New#Pass456")
+    assert client.get("/users/users", headers=headers).status_code == 401
+    assert client.post("/users/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+
+# Test Idempotent Retry of Event Creation
+def test_create_event_idempotent_retry():
+    from app.models import Event
+
+    organizer_id, organizer = auth_as("organizer")
+    event_data = {
+        "title": "Retry Conference",
+        "location": "Online",
+        "date": "2030-05-20T10:00:00Z"
+    }
+    headers = {**organizer, "Idempotency-Key": f"create-{uuid.uuid4().hex}"}
+
+    first = client.post("/events/events", json=event_data, headers=headers)
+    retry = client.post("/events/events", json=event_data, headers=headers)
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+
+    db = SessionLocal()
+    try:
+        assert db.query(Event).filter(Event.organizer_id == organizer_id).count() == 1
+    finally:
+        db.close()
+
+    # Same key, different payload
+    reused = client.post("/events/events", json={**event_data, "title": "Other Conference"}, headers=headers)
+    assert reused.status_code == 422
+
+# Test a Key Claimed by Another Worker Is Not Run Twice
+def test_idempotency_claim_across_workers(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse
+    from app import config
+    from app.middleware import IdempotencyMiddleware, idempotency_store_key
+    from app.services.auth import access_token_subject
+    from app.services.idempotency import DatabaseIdempotencyStore, StoredResponse
+
+    calls = []
+    worker = FastAPI()
+    worker.add_middleware(IdempotencyMiddleware, store=DatabaseIdempotencyStore(ttl_seconds=60, claim_seconds=60))
+
+    @worker.post("/work")
+    def work(fail: bool = False):
+        calls.append(fail)
+        return JSONResponse(status_code=503 if fail else 200, content={"call": len(calls)})
+
+    monkeypatch.setattr(config, "IDEMPOTENCY_WAIT_SECONDS", 0)
+    worker_client = TestClient(worker)
+    _, organizer = auth_as("organizer")
+    idempotency_key = f"work-{uuid.uuid4().hex}"
+    headers = {**organizer, "Idempotency-Key": idempotency_key}
+    store_key = idempotency_store_key(access_token_subject(organizer["Authorization"][7:]), idempotency_key)
+
+    # Another worker is running the request: the duplicate must not run the route
+    other_worker = DatabaseIdempotencyStore(ttl_seconds=60, claim_seconds=60)
+    assert other_worker.claim(store_key, "fingerprint")
+    assert not other_worker.claim(store_key, "fingerprint")
+    busy = worker_client.post("/work", headers=headers)
+    assert busy.status_code == 409
+    assert busy.headers["Retry-After"] == "1"
+    assert calls == []
+
+    # Once it stores its response, the duplicate replays it
+    other_worker.put(store_key, StoredResponse("fingerprint", 201, "application/json", b'{"call": 0}'))
+    assert other_worker.get(store_key).status_code == 201
+    assert not other_worker.claim(store_key, "fingerprint")
+
+    # A 5xx releases the claim, so the retry runs the route again
+    retry_key = f"work-{uuid.uuid4().hex}"
+    failed = worker_client.post("/work?fail=true", headers={**organizer, "Idempotency-Key": retry_key})
+    retried = worker_client.post("/work?fail=true", headers={**organizer, "Idempotency-Key": retry_key})
+    assert failed.status_code == retried.status_code == 503
+    assert calls == [True, True]
+    assert other_worker.claim(idempotency_store_key(access_token_subject(organizer["Authorization"][7:]), retry_key), "x")
+
+# Test Bulk Creation of a Weekly Series
+def test_create_events_bulk():
+    from datetime import datetime, timedelta
+
+    organizer_id, organizer = auth_as("organizer")
+    bulk_data = {
+        "template": {"title": "Weekly Standup", "location": "Online", "date": "2030-01-07T09:00:00Z"},
+        "recurrence": {"frequency": "weekly", "interval": 1, "count": 52}
+    }
+    response = client.post("/events/events/bulk", json=bulk_data, headers=organizer)
+    assert response.status_code == 201
+
+    events = response.json()
+    assert len(events) == 52
+    assert {event["organizer_id"] for event in events} == {organizer_id}
+    dates = [datetime.fromisoformat(event["date"].replace("Z", "+00:00")) for event in events]
+    assert all(later - earlier == timedelta(weeks=1) for earlier, later in zip(dates, dates[1:]))
+
+# Test Bulk Creation Is Limited to Organizers
+def test_create_events_bulk_requires_organizer():
+    _, attendee = auth_as("attendee")
+    bulk_data = {"events": [{"title": "Solo Event", "location": "Online", "date": "2030-01-07T09:00:00Z"}]}
+    assert client.post("/events/events/bulk", json=bulk_data, headers=attendee).status_code == 403
+
+# Test Fetching Many Events by ID
+def test_get_events_batch():
+    _, organizer = auth_as("organizer")
+    first_id = create_test_event(organizer, title="First Event")
+    second_id = create_test_event(organizer, title="Second Event")
+
+    response = client.get("/events/events/batch", params={"ids": [second_id, 999999, first_id]})
+    assert response.status_code == 200
+    assert [event["id"] for event in response.json()] == [second_id, first_id]  # Requested order, unknown skipped
+
 if __name__ == "__main__":
     pytest.main()